@@ -1,11 +1,26 @@
 import os
+import math
 import time
+import shelve
+import asyncio
 import logging
-import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-from binance.client import Client
+from dataclasses import dataclass
+from collections import deque
+from functools import lru_cache
+from binance import AsyncClient
+
+try:
+    import talib  # opcional: implementação em C do RSI
+    _HAS_TALIB = True
+except ImportError:
+    _HAS_TALIB = False
 
 # =============================
 # LOGS
@@ -25,22 +40,32 @@ if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     logging.error("❌ Variáveis do Telegram não configuradas!")
     exit(1)
 
+# Sessão única: reaproveita a conexão keep-alive com a API do Telegram
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1, pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.5)
+))
+SESSION.headers["Content-Type"] = "application/json"
+
 def send_telegram_message(message):
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message, "parse_mode": "HTML"}
     try:
-        response = requests.post(url, json=payload, timeout=10)
+        response = SESSION.post(url, data=orjson.dumps(payload), timeout=10)
         if response.status_code != 200:
-            logging.error(f"Erro Telegram {response.status_code}: {response.text}")
-        else:
-            logging.info("Mensagem enviada ao Telegram")
+            logging.error("Erro Telegram %s: %s", response.status_code, response.text)
+            return False
+        logging.info("Mensagem enviada ao Telegram")
+        return True
     except Exception as e:
-        logging.error(f"Erro enviando Telegram: {e}")
+        logging.error("Erro enviando Telegram: %s", e)
+        return False
 
 # =============================
 # CLIENTE BINANCE
 # =============================
-client = Client()  # público
+client = None  # AsyncClient público, criado em main()
 
 # =============================
 # MOEDAS E TIMEFRAMES
@@ -51,84 +76,207 @@ SYMBOLS = [
     "LINKUSDT", "AVAXUSDT"
 ]
 
-TIMEFRAMES = {
-    "1h": Client.KLINE_INTERVAL_1HOUR,
-    "4h": Client.KLINE_INTERVAL_4HOUR
-}
+# Só os candles de 1h são baixados; os de 4h são agregados a partir deles
+BASE_INTERVAL = AsyncClient.KLINE_INTERVAL_1HOUR
+BASE_SECONDS = 3600
+TIMEFRAMES = {"1h": 1, "4h": 4}  # candles de 1h por candle do timeframe
 LIMIT = 200
+BASE_LIMIT = LIMIT * max(TIMEFRAMES.values())
+
+# =============================
+# CANDLES
+# =============================
+@dataclass
+class OHLCV:
+    ts: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def tail(self, n):
+        return OHLCV(ts=self.ts[-n:], high=self.high[-n:], low=self.low[-n:], close=self.close[-n:])
+
+def to_ohlcv(rows):
+    # rows: um candle por linha (open_time, high, low, close)
+    ts, high, low, close = np.ascontiguousarray(rows.T)
+    return OHLCV(ts=ts, high=high, low=low, close=close)
+
+def resample(ohlcv, factor):
+    if factor == 1:
+        return ohlcv
+    # Candles alinhados em UTC, como os da Binance (00h, 04h, 08h...)
+    groups = ohlcv.ts // (factor * BASE_SECONDS * 1000)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    # Descarta o primeiro grupo se o histórico começou no meio dele
+    if len(starts) > 1 and starts[1] < factor:
+        starts = starts[1:]
+    ends = np.r_[starts[1:], len(groups)] - 1
+    return OHLCV(
+        ts=ohlcv.ts[starts],
+        high=np.maximum.reduceat(ohlcv.high, starts),
+        low=np.minimum.reduceat(ohlcv.low, starts),
+        close=ohlcv.close[ends],
+    )
+
+_klines_buffer = {}  # moeda -> últimos BASE_LIMIT candles de 1h (open_time, high, low, close)
+
+async def fetch_klines(symbol):
+    buffer = _klines_buffer.get(symbol)
+    max_age_ms = BASE_LIMIT * BASE_SECONDS * 1000
+    if buffer and time.time() * 1000 - buffer[-1][0] < max_age_ms:
+        # Só os candles novos, a partir do último conhecido (que ainda estava aberto)
+        klines = await client.futures_klines(
+            symbol=symbol, interval=BASE_INTERVAL, startTime=int(buffer[-1][0]), limit=BASE_LIMIT
+        )
+    else:
+        buffer = _klines_buffer[symbol] = deque(maxlen=BASE_LIMIT)
+        klines = await client.futures_klines(symbol=symbol, interval=BASE_INTERVAL, limit=BASE_LIMIT)
+    if klines:
+        rows = np.asarray(klines, dtype=np.float64)[:, [0, 2, 3, 4]]
+        while buffer and buffer[-1][0] >= rows[0, 0]:
+            buffer.pop()
+        buffer.extend(rows)
+    return np.array(buffer)
+
+async def get_series(symbol):
+    # Candles fechados vêm do buffer; o candle aberto é sempre atualizado
+    base = to_ohlcv(await fetch_klines(symbol))
+    return {tf_name: resample(base, factor).tail(LIMIT) for tf_name, factor in TIMEFRAMES.items()}
+
+# =============================
+# ESTADO PERSISTENTE
+# =============================
+# Sobrevive a reinícios do container: evita rebaixar candles e repetir alertas
+STATE_PATH = os.getenv("BOT_STATE_PATH", "/tmp/bot_state.db")
+state = None  # shelve aberto em main()
+_last_alerts = {}  # (moeda, timeframe) -> (abertura do candle, sinal)
+
+def load_state():
+    try:
+        _klines_buffer.update(state.get("klines", {}))
+        _last_alerts.update(state.get("alerts", {}))
+    except Exception as e:
+        logging.warning("Estado salvo ignorado: %s", e)
+
+def save_state():
+    state["klines"] = _klines_buffer
+    state["alerts"] = _last_alerts
+    state.sync()
 
 # =============================
 # INDICADORES
 # =============================
-def ema(series, period):
-    return series.ewm(span=period, adjust=False).mean()
+# As recorrências EMA/RMA viram um único produto escalar com pesos
+# (1 - alpha) ** k pré-calculados, do candle mais antigo ao mais recente
+EMA_PERIODS = (9, 12, 14, 20, 26)
+RSI_PERIOD = 14
+
+def _decay(alpha, n):
+    return (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=np.float64)
+
+_EMA_DECAY = {p: _decay(2 / (p + 1), LIMIT) for p in EMA_PERIODS}
 
-def rsi(close, period=14):
-    delta = close.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
+def ema(close, period):
+    # EMA (adjust=False, semente = primeiro fechamento); retorna só o último valor
+    n = len(close)
+    decay = _EMA_DECAY.get(period)
+    decay = decay[-n:] if decay is not None and n <= len(decay) else _decay(2 / (period + 1), n)
+    return float(decay[0] * close[0] + 2 / (period + 1) * (decay[1:] @ close[1:]))
+
+@lru_cache(maxsize=None)
+def _wilder_weights(period, n):
+    # Semente = média simples dos primeiros `period` valores, depois RMA
+    w = _decay(1 / period, n) / period
+    w[:period] = w[period - 1]
+    return w
+
+_wilder_weights(RSI_PERIOD, LIMIT - 1)
+
+def rsi(close, period=RSI_PERIOD):
+    # RSI de Wilder (RMA); retorna só o último valor
+    if len(close) <= period:
+        return np.nan
+    # Série sem variação: sem ganhos nem perdas, RSI indefinido (NaN, sem
+    # alerta) — regra única para o TA-Lib e para o NumPy
+    if np.all(close == close[0]):
+        return np.nan
+    if _HAS_TALIB:
+        return float(talib.RSI(close, timeperiod=period)[-1])
+    delta = np.diff(close)
+    w = _wilder_weights(period, len(delta))
+    gain = w @ np.maximum(delta, 0.0)
+    loss = -(w @ np.minimum(delta, 0.0))
+    # Só ganhos no período: RS infinito, RSI = 100
+    rs = gain / loss if loss > 0 else np.inf
+    return float(100 - 100 / (1 + rs))
 
 # =============================
 # SUPORTE / RESISTÊNCIA
 # =============================
-def detect_support_resistance(df, window=5):
-    highs, lows = df["high"], df["low"]
-    resistance, support = [], []
-    for i in range(window, len(df) - window):
-        if highs[i] == highs[i - window:i + window].max():
-            resistance.append(highs[i])
-        if lows[i] == lows[i - window:i + window].min():
-            support.append(lows[i])
+def detect_support_resistance(ohlcv, window=5):
+    highs, lows = ohlcv.high, ohlcv.low
+    n = len(highs) - 2 * window
+    if n <= 0:
+        return np.empty(0), np.empty(0)
+    # Janela [i - window, i + window) para cada candle central i
+    hv = sliding_window_view(highs, 2 * window)[:n]
+    lv = sliding_window_view(lows, 2 * window)[:n]
+    centers_h = highs[window:window + n]
+    centers_l = lows[window:window + n]
+    resistance = centers_h[centers_h == hv.max(axis=1)]
+    support = centers_l[centers_l == lv.min(axis=1)]
     def clean(levels):
+        # Guloso: compara com o último nível mantido, não com o vizinho,
+        # para um agrupamento largo não colapsar num nível só
         cleaned = []
-        for lvl in sorted(levels):
+        for lvl in np.sort(levels):
             if not cleaned or abs(lvl - cleaned[-1]) / cleaned[-1] > 0.005:
                 cleaned.append(lvl)
-        return cleaned
+        return np.asarray(cleaned, dtype=np.float64)
     return clean(support), clean(resistance)
 
-def detect_zone(df, rsi_val, price):
-    supports, resistances = detect_support_resistance(df)
-    near_support = any(abs(price - s) / s < 0.003 for s in supports)
-    near_resistance = any(abs(price - r) / r < 0.003 for r in resistances)
-    if rsi_val >= 70 and near_resistance:
+def near_level(price, levels, tol=0.003):
+    # Menor distância relativa entre o preço e os níveis, em uma passada
+    return levels.size > 0 and np.min(np.abs(price - levels) / levels) < tol
+
+def detect_zone(ohlcv, rsi_val, price):
+    # Só RSI extremo pode gerar sinal; evita detectar níveis à toa
+    if 30 < rsi_val < 70:
+        return None
+    supports, resistances = detect_support_resistance(ohlcv)
+    if rsi_val >= 70 and near_level(price, resistances):
         return "🔴 ALERTA VENDA"
-    elif rsi_val <= 30 and near_support:
+    elif rsi_val <= 30 and near_level(price, supports):
         return "🟢 ALERTA COMPRA"
     return None
 
 # =============================
 # ANÁLISE DE MOEDA
 # =============================
-def analyze_symbol(symbol):
+async def analyze_symbol(symbol):
     alerts = []
+    pending = {}  # alertas novos; só viram _last_alerts depois do envio
     rsi_list = []
-    for tf_name, tf_interval in TIMEFRAMES.items():
+    series = await get_series(symbol)
+    for tf_name, ohlcv in series.items():
         try:
-            klines = client.futures_klines(symbol=symbol, interval=tf_interval, limit=LIMIT)
-            df = pd.DataFrame(klines, columns=[
-                "open_time", "open", "high", "low", "close", "volume",
-                "close_time", "quote_asset_volume", "trades",
-                "taker_buy_base", "taker_buy_quote", "ignore"
-            ])
-            df["close"] = df["close"].astype(float)
-            df["high"] = df["high"].astype(float)
-            df["low"] = df["low"].astype(float)
-
-            price = df["close"].iloc[-1]
-            rsi_val = rsi(df["close"]).iloc[-1]
+            price = ohlcv.close[-1]
+            rsi_val = rsi(ohlcv.close)
             rsi_list.append(rsi_val)
 
-            signal = detect_zone(df, rsi_val, price)
+            signal = detect_zone(ohlcv, rsi_val, price)
             if not signal:
                 if rsi_val >= 70:
                     signal = "🔴 ALERTA VENDA"
                 elif rsi_val <= 30:
                     signal = "🟢 ALERTA COMPRA"
 
+            # Mesmo sinal no mesmo candle já foi enviado
+            alert_key = (symbol, tf_name)
+            if signal and _last_alerts.get(alert_key) == (ohlcv.ts[-1], signal):
+                signal = None
             if signal:
+                pending[alert_key] = (ohlcv.ts[-1], signal)
                 alerts.append(f"""
 {signal} ({tf_name})
 Moeda: {symbol}
@@ -137,7 +285,7 @@ RSI: {rsi_val:.2f}
 Horário: {datetime.now().strftime('%d/%m/%Y %H:%M')}
 """)
         except Exception as e:
-            logging.error(f"Erro analisando {symbol} {tf_name}: {e}")
+            logging.error("Erro analisando %s %s: %s", symbol, tf_name, e)
 
     # RSI médio entre 1h e 4h
     avg_rsi = np.mean(rsi_list)
@@ -148,17 +296,25 @@ Horário: {datetime.now().strftime('%d/%m/%Y %H:%M')}
     else:
         trend = "⚪ Mercado neutro (sem pressão significativa)"
 
-    return alerts, avg_rsi, trend
+    return alerts, pending, avg_rsi, trend
 
 # =============================
 # ANÁLISE DE TODAS AS MOEDAS
 # =============================
-def analyze_all():
+async def analyze_all():
     all_alerts = []
+    pending_alerts = {}
     rsi_values = []
-    for symbol in SYMBOLS:
-        alerts, avg_rsi, trend = analyze_symbol(symbol)
+    results = await asyncio.gather(
+        *(analyze_symbol(symbol) for symbol in SYMBOLS), return_exceptions=True
+    )
+    for symbol, result in zip(SYMBOLS, results):
+        if isinstance(result, Exception):
+            logging.error("Erro analisando %s: %s", symbol, result)
+            continue
+        alerts, pending, avg_rsi, trend = result
         all_alerts.extend(alerts)
+        pending_alerts.update(pending)
         rsi_values.append(avg_rsi)
 
     # Tendência geral final
@@ -173,19 +329,39 @@ def analyze_all():
         all_alerts.append(f"\n📊 Tendência Geral:\nRSI médio: {total_avg_rsi:.2f}\n{overall_trend}")
 
     if all_alerts:
-        send_telegram_message("\n".join(all_alerts))
+        # Alerta com envio falho não é marcado, para sair no próximo ciclo
+        if send_telegram_message("\n".join(all_alerts)):
+            _last_alerts.update(pending_alerts)
     else:
         logging.info("Nenhum sinal relevante neste ciclo.")
+    save_state()
 
 # =============================
 # LOOP PRINCIPAL 15 MINUTOS
 # =============================
-def main():
-    while True:
-        logging.info("🔍 Iniciando análise das criptomoedas...")
-        analyze_all()
-        logging.info("⏳ Aguardando 15 minutos para próximo ciclo...")
-        time.sleep(900)  # 15 minutos
+CYCLE_SECONDS = 900  # 15 minutos
+CANDLE_GRACE = 2  # segundos para a Binance publicar o candle recém-fechado
+
+def seconds_to_next_cycle():
+    # Acorda logo após o fechamento do próximo candle de 15 minutos
+    next_t = math.ceil(time.time() / CYCLE_SECONDS) * CYCLE_SECONDS
+    return next_t - time.time() + CANDLE_GRACE
+
+async def main():
+    global client, state
+    state = shelve.open(STATE_PATH)
+    load_state()
+    client = await AsyncClient.create()
+    try:
+        while True:
+            logging.info("🔍 Iniciando análise das criptomoedas...")
+            await analyze_all()
+            delay = seconds_to_next_cycle()
+            logging.info("⏳ Aguardando %.1f minutos para próximo ciclo...", delay / 60)
+            await asyncio.sleep(delay)
+    finally:
+        await client.close_connection()
+        state.close()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())